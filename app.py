@@ -2,13 +2,22 @@
 import os
 import time
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import sqlite3
 import ssl
 import socket
-from datetime import datetime, timedelta
-from threading import Thread
-from flask import Flask, render_template, request, redirect, url_for, Response, jsonify
+from functools import lru_cache
+from types import MappingProxyType
+from urllib.parse import urlsplit
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from queue import Queue, Empty, Full
+from threading import Thread, Lock, Condition, BoundedSemaphore, Event
+from flask import Flask, render_template, request, redirect, url_for, Response
 import json
+import orjson
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -19,6 +28,24 @@ DB_NAME = "sites.db"
 TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
 TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
 
+# Upper bound on how long the poller sleeps, so new or resumed sites are picked up quickly
+MAX_POLL_SLEEP = 10
+EXECUTOR = ThreadPoolExecutor(max_workers=32)
+_IN_FLIGHT = set()  # ids of sites with a check currently running
+_IN_FLIGHT_LOCK = Lock()
+_POLL_WAKE = Event()
+
+# Shared HTTP session: keep-alive connections are reused between checks
+SESSION = requests.Session()
+SESSION.headers["User-Agent"] = "UptimeMonitor/1.0"
+# No retries for site checks: a retry would hide downtime and inflate response_time
+_adapter = HTTPAdapter(pool_connections=64, pool_maxsize=64, max_retries=0)
+SESSION.mount("http://", _adapter)
+SESSION.mount("https://", _adapter)
+# Alerts should get through a transient network error, so only Telegram retries
+SESSION.mount("https://api.telegram.org/", HTTPAdapter(
+    max_retries=Retry(total=2, backoff_factor=0.2)))
+
 # Load translations from JSON files
 
 
@@ -31,28 +58,160 @@ def load_translations():
 
 
 TRANSLATIONS = load_translations()
+DEFAULT_LANG = 'ru'
+
+# Template context per language, built once at startup
+LANG_CONTEXTS = {
+    lang: {"t": MappingProxyType(t), "lang": lang}
+    for lang, t in TRANSLATIONS.items()
+}
 
 
+# Flask only runs context processors when rendering a template,
+# so /api/* and /stream never pay for this
 @app.context_processor
 def inject_lang():
     # Get language from URL parameter, default is 'ru'
-    lang = request.args.get('lang', 'ru')  # /?lang=en
-    t = TRANSLATIONS.get(lang, TRANSLATIONS['ru'])
-    return dict(t=t, lang=lang)
+    lang = request.args.get('lang', DEFAULT_LANG)  # /?lang=en
+    return LANG_CONTEXTS.get(lang) or LANG_CONTEXTS[DEFAULT_LANG]
+
+# === Database connections: one shared writer, a pool of readers ===
+
+
+READER_POOL_SIZE = 8
+_WRITE_LOCK = Lock()
+_WRITER = None
+_READERS = Queue(maxsize=READER_POOL_SIZE)
+
+# Bumped after every committed write; SSE clients wait on EVENT for it to change
+EVENT = Condition()
+_DATA_VERSION = 0
+
+
+def get_db(read_only=False):
+    conn = sqlite3.connect(DB_NAME, check_same_thread=False,
+                           isolation_level=None)
+    # WAL + synchronous=NORMAL is crash-safe and avoids an fsync per commit;
+    # busy_timeout lets parallel checks wait for the write lock instead of failing
+    conn.executescript("""
+        PRAGMA journal_mode=WAL;
+        PRAGMA synchronous=NORMAL;
+        PRAGMA cache_size=-65536;
+        PRAGMA mmap_size=268435456;
+        PRAGMA temp_store=MEMORY;
+        PRAGMA busy_timeout=5000;
+    """)
+    if read_only:
+        conn.execute("PRAGMA query_only=1;")
+    return conn
 
-# === Safe database connection (thread-safe) ===
 
+@contextmanager
+def reader():
+    # WAL lets readers run alongside the writer, so borrow any idle connection
+    try:
+        conn = _READERS.get_nowait()
+    except Empty:
+        conn = get_db(read_only=True)
+    try:
+        yield conn
+    finally:
+        try:
+            _READERS.put_nowait(conn)
+        except Full:
+            conn.close()
+
+
+@contextmanager
+def writer():
+    # All writes go through a single long-lived connection, one transaction at a time
+    global _WRITER
+    with _WRITE_LOCK:
+        if _WRITER is None:
+            _WRITER = get_db()
+        # IMMEDIATE takes the write lock up front instead of failing mid-transaction
+        _WRITER.execute("BEGIN IMMEDIATE")
+        try:
+            yield _WRITER
+        except Exception:
+            _WRITER.execute("ROLLBACK")
+            raise
+        _WRITER.execute("COMMIT")
+    _notify_change()
 
-def get_db():
-    conn = sqlite3.connect(DB_NAME, check_same_thread=False)
-    conn.execute("PRAGMA journal_mode=WAL;")
-    return conn
+
+def _notify_change():
+    global _DATA_VERSION
+    with EVENT:
+        _DATA_VERSION += 1
+        EVENT.notify_all()
+
+
+def write(sql, params=()):
+    with writer() as conn:
+        conn.execute(sql, params)
+
+# === Buffered log writes ===
+
+
+LOG_FLUSH_INTERVAL = 1  # seconds
+LOG_QUEUE = Queue(maxsize=10000)
+MAINTENANCE_INTERVAL = 5 * 60  # seconds
+
+
+def flush_logs():
+    rows = []
+    try:
+        while True:
+            rows.append(LOG_QUEUE.get_nowait())
+    except Empty:
+        pass
+    if rows:
+        try:
+            with writer() as conn:
+                conn.executemany(
+                    "INSERT INTO logs (site_id, status, response_time, timestamp) VALUES (?, ?, ?, ?)",
+                    rows
+                )
+        except Exception:
+            # Put the batch back so the next flush retries it
+            for i, row in enumerate(rows):
+                try:
+                    LOG_QUEUE.put_nowait(row)
+                except Full:
+                    print(f"⚠️ Log queue is full, {len(rows) - i} results dropped")
+                    break
+            raise
+    return len(rows)
+
+
+def maintenance_loop():
+    # Keep the -wal file from growing under heavy inserts and refresh planner stats
+    while True:
+        time.sleep(MAINTENANCE_INTERVAL)
+        try:
+            with _WRITE_LOCK:
+                if _WRITER is not None:
+                    _WRITER.execute("PRAGMA wal_checkpoint(TRUNCATE);")
+                    _WRITER.execute("PRAGMA optimize;")
+        except Exception as e:
+            print(f"🚨 Maintenance error: {e}")
+
+
+def log_writer_loop():
+    # One transaction per interval instead of one commit per check
+    while True:
+        time.sleep(LOG_FLUSH_INTERVAL)
+        try:
+            flush_logs()
+        except Exception as e:
+            print(f"🚨 Log writer error: {e}")
 
 # === Initialize the database ===
 
 
 def init_db():
-    with get_db() as conn:
+    with writer() as conn:
         conn.execute("""
             CREATE TABLE IF NOT EXISTS sites (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -62,37 +221,93 @@ def init_db():
                 enabled INTEGER DEFAULT 1
             )
         """)
+        # Older databases stored timestamps as ISO strings; move them to unix seconds
+        columns = {c[1]: c[2] for c in conn.execute("PRAGMA table_info(logs)")}
+        migrate = columns.get("timestamp", "").upper() == "TEXT"
+        if migrate:
+            conn.execute("ALTER TABLE logs RENAME TO logs_old")
         conn.execute("""
             CREATE TABLE IF NOT EXISTS logs (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 site_id INTEGER,
                 status INTEGER,
                 response_time REAL,
-                timestamp TEXT,
+                timestamp INTEGER NOT NULL,
                 FOREIGN KEY (site_id) REFERENCES sites (id)
             )
         """)
+        if migrate:
+            conn.execute("""
+                INSERT INTO logs (id, site_id, status, response_time, timestamp)
+                SELECT id, site_id, status, response_time,
+                       CAST(strftime('%s', timestamp, 'utc') AS INTEGER)
+                FROM logs_old
+                WHERE timestamp IS NOT NULL
+            """)
+            conn.execute("DROP TABLE logs_old")
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_logs_site_ts ON logs (site_id, timestamp DESC)")
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_logs_ts ON logs (timestamp)")
+        # Refresh planner statistics so the indexes above are used
+        conn.execute("ANALYZE")
 
 # === Check SSL certificate expiration ===
 
 
+SSL_CACHE_TTL = 6 * 60 * 60  # seconds
+_SSL_CACHE = {}  # (hostname, port) -> (expires_at monotonic, expiry datetime)
+# Loading the CA bundle is expensive, so build the context once and share it
+SSL_CTX = ssl.create_default_context()
+SSL_CTX.check_hostname = True
+
+
 def check_ssl_expiry(hostname, port=443):
-    try:
-        context = ssl.create_default_context()
-        with socket.create_connection((hostname, port), timeout=10) as sock:
-            with context.wrap_socket(sock, server_hostname=hostname) as ssock:
-                cert = ssock.getpeercert()
-                expiry_str = cert['notAfter']
-                expiry_date = datetime.strptime(
-                    expiry_str, '%b %d %H:%M:%S %Y %Z')
-                days_left = (expiry_date - datetime.utcnow()).days
-                return days_left, expiry_date.strftime('%Y-%m-%d')
-    except Exception as e:
-        return None, str(e)
+    # Certificates rarely change, so skip the TLS handshake while the cache is fresh
+    cached = _SSL_CACHE.get((hostname, port))
+    if cached and cached[0] > time.monotonic():
+        expiry_date = cached[1]
+    else:
+        try:
+            with socket.create_connection((hostname, port), timeout=10) as sock:
+                with SSL_CTX.wrap_socket(sock, server_hostname=hostname) as ssock:
+                    cert = ssock.getpeercert()
+                    expiry_str = cert['notAfter']
+                    expiry_date = datetime.strptime(
+                        expiry_str, '%b %d %H:%M:%S %Y %Z')
+        except Exception as e:
+            return None, str(e)
+        _SSL_CACHE[(hostname, port)] = (
+            time.monotonic() + SSL_CACHE_TTL, expiry_date)
+    # Days left are recomputed on every call so the expiry alert stays accurate
+    days_left = (expiry_date - datetime.utcnow()).days
+    return days_left, expiry_date.strftime('%Y-%m-%d')
 
 # === Check website status ===
 
 
+@lru_cache(maxsize=512)
+def _host(url):
+    # Malformed URLs (e.g. "https://[::1") have no host; the check then fails as down
+    try:
+        return urlsplit(url).hostname
+    except ValueError:
+        return None
+
+
+def _contains_text(response, text):
+    # Scan the body chunk by chunk and stop downloading as soon as the text is found
+    response.encoding = response.encoding or 'utf-8'
+    tail = ''
+    for chunk in response.iter_content(65536, decode_unicode=True):
+        window = tail + chunk
+        if text in window:
+            return True
+        # Keep enough of the end to catch a match split across chunks
+        tail = window[max(len(window) - len(text) + 1, 0):]
+    return False
+
+
 def check_site(site):
     site_id = site[0]
     url = site[1]
@@ -100,33 +315,41 @@ def check_site(site):
     start = time.time()
 
     ssl_info = None
-    if url.startswith("https://"):
-        hostname = url.split("://")[1].split("/")[0].split(":")[0]
+    hostname = _host(url) if url.startswith("https://") else None
+    if hostname:
         days_left, expiry = check_ssl_expiry(hostname)
         if days_left is not None:
             ssl_info = f"SSL: expires {expiry} ({days_left} days left)"
             if days_left < 7:
-                send_telegram(
+                ALERT_QUEUE.put(
                     f"⚠️ <b>SSL will expire soon!</b>\n\n🌐 <code>{url}</code>\n📅 Left: {days_left} days")
 
     try:
-        r = requests.get(url, timeout=10, headers={
-                         'User-Agent': 'UptimeMonitor/1.0'})
-        response_time = time.time() - start
-        content_ok = True
         if expected_text and expected_text.strip():
-            content_ok = expected_text in r.text
+            with SESSION.get(url, timeout=10, stream=True) as r:
+                content_ok = _contains_text(r, expected_text)
+        else:
+            # Only the status code matters, so don't download the page
+            r = SESSION.head(url, timeout=10, allow_redirects=True)
+            if r.status_code != 200:
+                # Many servers, CDNs and WAFs reject HEAD but serve GET normally;
+                # confirm with a GET before marking the site down, without reading the body
+                with SESSION.get(url, timeout=10, stream=True) as r:
+                    pass
+            content_ok = True
+        response_time = time.time() - start
         status = 1 if (r.status_code == 200 and content_ok) else 0
     except Exception:
         response_time = None
         status = 0
 
     # Log the result
-    with get_db() as conn:
-        conn.execute(
-            "INSERT INTO logs (site_id, status, response_time, timestamp) VALUES (?, ?, ?, ?)",
-            (site_id, status, response_time, datetime.now().isoformat())
-        )
+    try:
+        LOG_QUEUE.put_nowait(
+            (site_id, status, response_time, int(time.time())))
+    except Full:
+        # Never block a check worker if the log writer falls behind
+        print(f"⚠️ Log queue is full, result for {url} dropped")
 
     # Send alert if site is down
     if status == 0:
@@ -159,7 +382,7 @@ def check_site(site):
 """
 
         if TELEGRAM_TOKEN and TELEGRAM_CHAT_ID:
-            send_telegram(message)
+            ALERT_QUEUE.put(message)
         else:
             print("ℹ️ Telegram is not configured")
 
@@ -178,7 +401,7 @@ def send_telegram(message):
             "parse_mode": "HTML",
             "disable_web_page_preview": True
         }
-        response = requests.post(url, data=data, timeout=10)
+        response = SESSION.post(url, data=data, timeout=10)
         if response.status_code == 200:
             print("✅ Notification sent to Telegram")
         else:
@@ -186,32 +409,127 @@ def send_telegram(message):
     except Exception as e:
         print(f"⚠️ Telegram error: {e}")
 
+# === Batch alerts into as few Telegram messages as possible ===
+
+
+ALERT_DEBOUNCE = 0.5  # seconds to collect alerts before sending
+ALERT_SEPARATOR = "\n\n---\n\n"
+TELEGRAM_MAX_LEN = 4096
+ALERT_QUEUE = Queue()
+# Telegram POSTs run off the alert thread; cap pending sends so an outage can't pile them up
+ALERT_MAX_PENDING = 20
+ALERT_POOL = ThreadPoolExecutor(max_workers=2, thread_name_prefix="tg")
+_ALERT_SLOTS = BoundedSemaphore(ALERT_MAX_PENDING)
+
+
+def submit_telegram(message):
+    if not _ALERT_SLOTS.acquire(blocking=False):
+        print("⚠️ Telegram backlog is full, alert dropped")
+        return
+    future = ALERT_POOL.submit(send_telegram, message)
+    future.add_done_callback(lambda _: _ALERT_SLOTS.release())
+
+
+def alert_loop():
+    while True:
+        messages = [ALERT_QUEUE.get()]
+        deadline = time.monotonic() + ALERT_DEBOUNCE
+        while (remaining := deadline - time.monotonic()) > 0:
+            try:
+                messages.append(ALERT_QUEUE.get(timeout=remaining))
+            except Empty:
+                break
+
+        # Join alerts into as few messages as fit into Telegram's length limit
+        batch = messages[0]
+        for message in messages[1:]:
+            if len(batch) + len(ALERT_SEPARATOR) + len(message) > TELEGRAM_MAX_LEN:
+                submit_telegram(batch)
+                batch = message
+            else:
+                batch += ALERT_SEPARATOR + message
+        submit_telegram(batch)
+
 # === Background polling loop ===
 
 
 def polling_loop():
     print("✅ Monitoring started...")
+    next_due = {}  # site_id -> monotonic time of the next check
     while True:
         try:
-            with get_db() as conn:
+            with reader() as conn:
                 sites = conn.execute(
                     "SELECT id, url, check_interval, expected_text FROM sites WHERE enabled = 1").fetchall()
+            # Forget sites that were deleted or paused
+            next_due = {s[0]: next_due[s[0]] for s in sites if s[0] in next_due}
+
+            now = time.monotonic()
+            with _IN_FLIGHT_LOCK:
+                in_flight = set(_IN_FLIGHT)
+            # Checks are I/O bound, so run them in parallel without waiting for them:
+            # a hanging site must not delay the others
             for site in sites:
-                check_site(site)
-                time.sleep(1)
-            time.sleep(10)
+                if site[0] in in_flight or next_due.get(site[0], 0) > now:
+                    continue
+                next_due[site[0]] = now + (site[2] or 60)
+                with _IN_FLIGHT_LOCK:
+                    _IN_FLIGHT.add(site[0])
+                EXECUTOR.submit(check_site, site).add_done_callback(
+                    lambda future, site_id=site[0]: _check_done(site_id, future))
+
+            # Sites still being checked are rescheduled when their check finishes
+            wake = min((due for site_id, due in next_due.items()
+                        if site_id not in in_flight), default=now + MAX_POLL_SLEEP)
+            _POLL_WAKE.wait(min(max(wake - time.monotonic(), 0), MAX_POLL_SLEEP))
+            _POLL_WAKE.clear()
         except Exception as e:
             print(f"🚨 Error: {e}")
             time.sleep(10)
 
 
+def _check_done(site_id, future):
+    with _IN_FLIGHT_LOCK:
+        _IN_FLIGHT.discard(site_id)
+    if future.exception():
+        print(f"🚨 Error checking site {site_id}: {future.exception()}")
+    # Let the poller pick up a site whose next check came due while this one ran
+    _POLL_WAKE.set()
+
+
 def start_polling():
+    Thread(target=log_writer_loop, daemon=True).start()
+    Thread(target=maintenance_loop, daemon=True).start()
+    Thread(target=alert_loop, daemon=True).start()
     thread = Thread(target=polling_loop, daemon=True)
     thread.start()
 
+# === Format log timestamps ===
+
+
+def format_ts(ts):
+    # Log timestamps are unix seconds; show them in server local time
+    return datetime.fromtimestamp(ts).strftime('%Y-%m-%d %H:%M:%S') if ts else None
+
+
+app.add_template_filter(format_ts)
+
+# Latest log row per site, computed in a single pass over the logs table
+LATEST_LOGS_CTE = """
+    latest AS (
+        SELECT site_id, status, response_time, timestamp,
+               ROW_NUMBER() OVER (PARTITION BY site_id ORDER BY timestamp DESC) AS rn
+        FROM logs
+    )
+"""
+
 # === Web routes ===
 
 
+def json_response(payload):
+    return Response(orjson.dumps(payload), mimetype='application/json')
+
+
 @app.route("/", methods=["GET", "POST"])
 def index():
     if request.method == "POST":
@@ -219,24 +537,27 @@ def index():
         interval = max(10, int(request.form.get("interval", 60)))
         text = request.form.get("text", "").strip()
         if url:
-            with get_db() as conn:
-                conn.execute(
-                    "INSERT INTO sites (url, check_interval, expected_text) VALUES (?, ?, ?)",
-                    (url, interval, text or None)
-                )
+            write(
+                "INSERT INTO sites (url, check_interval, expected_text) VALUES (?, ?, ?)",
+                (url, interval, text or None)
+            )
         return redirect(url_for("index"))
 
-    with get_db() as conn:
-        sites = conn.execute("""
+    with reader() as conn:
+        sites = conn.execute(f"""
+            WITH {LATEST_LOGS_CTE},
+            agg AS (
+                SELECT site_id, SUM(status) * 100.0 / COUNT(*) AS uptime_percent
+                FROM logs
+                GROUP BY site_id
+            )
             SELECT
                 s.id, s.url, s.check_interval, s.expected_text, s.enabled,
                 l.status, l.response_time, l.timestamp,
-                (SELECT COUNT(*) FROM logs WHERE site_id = s.id AND status = 1) * 100.0 /
-                (SELECT COUNT(*) FROM logs WHERE site_id = s.id) AS uptime_percent
+                agg.uptime_percent
             FROM sites s
-            LEFT JOIN logs l ON l.id = (
-                SELECT id FROM logs WHERE site_id = s.id ORDER BY timestamp DESC LIMIT 1
-            )
+            LEFT JOIN latest l ON l.site_id = s.id AND l.rn = 1
+            LEFT JOIN agg ON agg.site_id = s.id
             ORDER BY s.url
         """).fetchall()
 
@@ -245,76 +566,120 @@ def index():
 
 @app.route("/toggle/<int:site_id>")
 def toggle(site_id):
-    with get_db() as conn:
-        site = conn.execute(
-            "SELECT enabled FROM sites WHERE id = ?", (site_id,)).fetchone()
-        new_state = 0 if site[0] else 1
-        conn.execute("UPDATE sites SET enabled = ? WHERE id = ?",
-                     (new_state, site_id))
+    write("UPDATE sites SET enabled = 1 - enabled WHERE id = ?", (site_id,))
     return redirect(url_for("index"))
 
 
 @app.route("/delete/<int:site_id>")
 def delete(site_id):
-    with get_db() as conn:
+    with writer() as conn:
         conn.execute("DELETE FROM sites WHERE id = ?", (site_id,))
         conn.execute("DELETE FROM logs WHERE site_id = ?", (site_id,))
     return redirect(url_for("index"))
 
 
+LOG_CACHE_TTL = 5  # seconds
+LOG_CACHE_SIZE = 256
+_LOG_CACHE_LOCK = Lock()
+_LOG_CACHE = {}  # (site_id, days) -> (cached_at monotonic, JSON payload)
+
+
 @app.route("/api/logs/<int:site_id>")
 def api_logs(site_id):
     days = request.args.get("days", 7, type=int)
-    since = datetime.now() - timedelta(days=days)
-    with get_db() as conn:
-        logs = conn.execute("""
-            SELECT status, response_time, timestamp FROM logs
+    key = (site_id, days)
+    # Several open dashboards ask for the same chart; serve them one query
+    with _LOG_CACHE_LOCK:
+        cached = _LOG_CACHE.get(key)
+    if cached and time.monotonic() - cached[0] < LOG_CACHE_TTL:
+        return Response(cached[1], mimetype='application/json')
+
+    since = int(time.time()) - days * 86400
+    # Rows are formatted inside SQLite and ordered by the fetch itself,
+    # so Python only serializes them
+    with reader() as conn:
+        points = conn.execute("""
+            SELECT
+                strftime('%Y-%m-%d %H:%M:%S', timestamp, 'unixepoch', 'localtime'),
+                CASE WHEN response_time THEN round(response_time, 3) END
+            FROM logs
             WHERE site_id = ? AND timestamp > ?
             ORDER BY timestamp
-        """, (site_id, since.isoformat())).fetchall()
-    return Response(json.dumps([
-        {"x": log[2].split(".")[0].replace("T", " "),
-         "y": round(log[1], 3) if log[1] else None}
-        for log in logs
-    ]), mimetype='application/json')
+        """, (site_id, since)).fetchall()
+    payload = orjson.dumps([{"x": x, "y": y} for x, y in points])
+
+    now = time.monotonic()
+    with _LOG_CACHE_LOCK:
+        if len(_LOG_CACHE) >= LOG_CACHE_SIZE:
+            for k, (cached_at, _) in list(_LOG_CACHE.items()):
+                if now - cached_at >= LOG_CACHE_TTL:
+                    del _LOG_CACHE[k]
+            if len(_LOG_CACHE) >= LOG_CACHE_SIZE:
+                _LOG_CACHE.clear()
+        _LOG_CACHE[key] = (now, payload)
+    return Response(payload, mimetype='application/json')
+
+
+STREAM_KEEPALIVE = 30  # seconds
+_SNAPSHOT_LOCK = Lock()
+_SNAPSHOT = (None, None)  # (data version, serialized JSON)
 
 
 @app.route("/stream")
 def stream():
     def event_stream():
+        last_payload = None
         while True:
-            with get_db() as conn:
-                sites = conn.execute("""
+            version, payload = stream_snapshot()
+            if payload != last_payload:
+                yield f"data: {payload}\n\n"
+                last_payload = payload
+            else:
+                # Keep idle connections open through proxies
+                yield ": keepalive\n\n"
+            with EVENT:
+                EVENT.wait_for(lambda: _DATA_VERSION != version,
+                               timeout=STREAM_KEEPALIVE)
+    return Response(event_stream(), mimetype="text/event-stream")
+
+
+def stream_snapshot():
+    # All SSE clients share one query + serialization per data change
+    global _SNAPSHOT
+    with _SNAPSHOT_LOCK:
+        version = _DATA_VERSION
+        if _SNAPSHOT[0] != version:
+            with reader() as conn:
+                sites = conn.execute(f"""
+                    WITH {LATEST_LOGS_CTE}
                     SELECT s.id, s.url, s.enabled, l.status, l.response_time, l.timestamp
                     FROM sites s
-                    LEFT JOIN logs l ON l.id = (
-                        SELECT id FROM logs WHERE site_id = s.id ORDER BY timestamp DESC LIMIT 1
-                    )
+                    LEFT JOIN latest l ON l.site_id = s.id AND l.rn = 1
                 """).fetchall()
             data = [
                 {
                     "id": s[0], "url": s[1], "enabled": s[2],
                     "status": "up" if s[3] == 1 else "down",
                     "response_time": round(s[4], 3) if s[4] else None,
-                    "timestamp": s[5].split('.')[0].replace('T', ' ') if s[5] else None
+                    "timestamp": format_ts(s[5])
                 }
                 for s in sites
             ]
-            yield f"data: {json.dumps(data)}\n\n"
-            time.sleep(5)
-    return Response(event_stream(), mimetype="text/event-stream")
+            _SNAPSHOT = (version, orjson.dumps(data).decode())
+        return _SNAPSHOT
 
 
 @app.route("/admin")
 def admin():
-    with get_db() as conn:
+    with reader() as conn:
         # General statistics
         total = conn.execute("SELECT COUNT(*) FROM sites").fetchone()[0]
         active = conn.execute(
             "SELECT COUNT(*) FROM sites WHERE enabled = 1").fetchone()[0]
-        up_now = conn.execute("""
+        up_now = conn.execute(f"""
+            WITH {LATEST_LOGS_CTE}
             SELECT COUNT(*) FROM sites s
-            JOIN logs l ON l.id = (SELECT id FROM logs WHERE site_id = s.id ORDER BY timestamp DESC LIMIT 1)
+            JOIN latest l ON l.site_id = s.id AND l.rn = 1
             WHERE l.status = 1
         """).fetchone()[0]
         down_now = active - up_now
@@ -347,69 +712,48 @@ def admin():
 @app.route("/api/downtime-stats")
 def downtime_stats():
     days = 30
-    since = datetime.now() - timedelta(days=days)
-    stats = {}
-    with get_db() as conn:
-        logs = conn.execute("""
-            SELECT l.status, l.response_time, l.timestamp
-            FROM logs l
-            WHERE l.timestamp > ?
-        """, (since.isoformat(),)).fetchall()
-    for log in logs:
-        date = log[2].split('T')[0]
-        if date not in stats:
-            stats[date] = {"down": 0, "slow": 0}
-        if log[0] == 0:
-            stats[date]["down"] += 1
-        elif log[1] and log[1] > 2.0:
-            stats[date]["slow"] += 1
-    result = {}
-    for d, c in stats.items():
-        result[d] = "down" if c["down"] > 0 else "slow" if c["slow"] > 0 else "up"
-    return result
+    since = int(time.time()) - days * 86400
+    with reader() as conn:
+        days_stats = conn.execute("""
+            SELECT
+                date(timestamp, 'unixepoch', 'localtime') AS day,
+                SUM(CASE WHEN status = 0 THEN 1 ELSE 0 END) AS down,
+                SUM(CASE WHEN status = 1 AND response_time > 2.0 THEN 1 ELSE 0 END) AS slow
+            FROM logs
+            WHERE timestamp > ?
+            GROUP BY day
+        """, (since,)).fetchall()
+    return json_response({
+        day: "down" if down > 0 else "slow" if slow > 0 else "up"
+        for day, down, slow in days_stats
+    })
 
 
 @app.route("/api/admin/stats")
 def admin_stats():
     days = request.args.get("days", default=7, type=int)
     days = max(1, days)
-    since = f"datetime('now', '-{days} days')"
+    since = int(time.time()) - days * 86400
 
-    with get_db() as conn:
-        uptime_data = conn.execute(f"""
+    # One pass over the window instead of a separate query per metric
+    with reader() as conn:
+        stats = conn.execute("""
             SELECT
                 s.url,
-                (SUM(CASE WHEN l.status = 1 THEN 1 ELSE 0 END) * 100.0 / COUNT(l.id)) AS uptime
+                SUM(CASE WHEN l.status = 1 THEN 1 ELSE 0 END) * 100.0 / COUNT(l.id) AS uptime,
+                AVG(CASE WHEN l.status = 1 THEN l.response_time END) AS avg_time,
+                SUM(CASE WHEN l.status = 0 THEN 1 ELSE 0 END) AS down_count
             FROM sites s
             JOIN logs l ON l.site_id = s.id
-            WHERE l.timestamp > {since}
-            GROUP BY s.id
-        """).fetchall()
-
-        avg_response = conn.execute(f"""
-            SELECT
-                s.url,
-                AVG(l.response_time) AS avg_time
-            FROM sites s
-            JOIN logs l ON l.site_id = s.id
-            WHERE l.status = 1 AND l.timestamp > {since}
-            GROUP BY s.id
-        """).fetchall()
-
-        downtime_count = conn.execute(f"""
-            SELECT
-                s.url,
-                COUNT(*) AS down_count
-            FROM sites s
-            JOIN logs l ON l.site_id = s.id
-            WHERE l.status = 0 AND l.timestamp > {since}
+            WHERE l.timestamp > ?
             GROUP BY s.id
-        """).fetchall()
+        """, (since,)).fetchall()
 
-    return jsonify({
-        "uptime": [{"url": row[0], "value": round(row[1], 1)} for row in uptime_data],
-        "response": [{"url": row[0], "value": round(row[1] or 0, 3)} for row in avg_response],
-        "downtime": [{"url": row[0], "value": row[1]} for row in downtime_count]
+    return json_response({
+        "uptime": [{"url": row[0], "value": round(row[1], 1)} for row in stats],
+        "response": [{"url": row[0], "value": round(row[2] or 0, 3)}
+                     for row in stats if row[1] > 0],
+        "downtime": [{"url": row[0], "value": row[3]} for row in stats if row[3]]
     })
 
 